@@ -0,0 +1,190 @@
+"""
+    bench_subrosa
+    ~~~~~~~~~~~~~
+
+    Benchmarks for the hot paths of subrosa, using pytest-benchmark. Run them
+    with::
+
+        tox -e benchmark
+
+    which saves the results, so that later runs can be compared against them
+    with::
+
+        tox -e benchmark-compare
+
+    This fails, if the minimum time of any benchmark regressed by more than
+    10%. The startup benchmarks are not compared, because the time it takes
+    to start a process varies too much between runs.
+
+    By default only cheap combinations of secret size, threshold and share
+    count are benchmarked, which still includes secrets processed by the
+    numpy backend and secrets spanning several blocks. Pass
+    ``--benchmark-full`` to sweep all of them, from 32 B to 100 MiB and from
+    2 to 255 shares.
+
+    In addition to the timings, the throughput in bytes per second and the
+    peak memory allocated during a single call are stored as `extra_info`
+    with each benchmark.
+
+    The startup benchmarks measure how long it takes to start a Python
+    process importing subrosa, which matters for short-lived processes such
+    as the command line interface.
+
+    :copyright: 2016 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import os
+import re
+import subprocess
+import sys
+import tracemalloc
+
+import pytest
+
+from subrosa import Share, add_share, recover_secret, split_secret
+
+
+#: 32 KiB and larger secrets are processed by the numpy backend, if it's
+#: installed, 256 KiB secrets span several blocks.
+SECRET_SIZES = [
+    32, 1024, 32 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024,
+    100 * 1024 * 1024
+]
+
+#: Pairs of threshold and share count.
+SHARINGS = [(2, 2), (2, 255), (3, 5), (16, 32), (128, 128), (255, 255)]
+
+#: Benchmarks processing more than this number of bytes multiplied by
+#: threshold and share count are only run with ``--benchmark-full``.
+QUICK_COST_LIMIT = 2 ** 20
+
+#: The number of rounds for a benchmark is chosen, so that the overall cost
+#: doesn't exceed this number, with an upper limit of `MAX_ROUNDS`.
+ROUND_COST_LIMIT = 2 ** 24
+MAX_ROUNDS = 20
+
+
+def size_id(size):
+    for unit, factor in [('MiB', 1024 ** 2), ('KiB', 1024)]:
+        if size >= factor:
+            return '{}{}'.format(size // factor, unit)
+    return '{}B'.format(size)
+
+
+def sharing_id(sharing):
+    return '{}of{}'.format(*sharing)
+
+
+@pytest.fixture(params=SECRET_SIZES, ids=size_id)
+def secret_size(request):
+    return request.param
+
+
+@pytest.fixture(params=SHARINGS, ids=sharing_id)
+def sharing(request):
+    return request.param
+
+
+#: Recovering only depends on the threshold, not on the share count.
+@pytest.fixture(params=sorted({threshold for threshold, _ in SHARINGS}))
+def threshold(request):
+    return request.param
+
+
+def peak_memory(function, *args):
+    """
+    Returns the peak number of bytes allocated while calling `function`.
+    """
+    tracemalloc.start()
+    try:
+        function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def skip_expensive(config, cost):
+    if cost > QUICK_COST_LIMIT and not config.getoption('--benchmark-full'):
+        pytest.skip('expensive benchmark, use --benchmark-full to run')
+
+
+def run(benchmark, cost, byte_count, function, *args):
+    """
+    Benchmarks `function` called with `args`, which processes `byte_count`
+    bytes of a secret at a given `cost`.
+    """
+    benchmark.extra_info['peak_memory'] = peak_memory(function, *args)
+    rounds = max(1, min(MAX_ROUNDS, ROUND_COST_LIMIT // cost))
+    benchmark.pedantic(function, args, rounds=rounds, warmup_rounds=1)
+    if benchmark.stats is not None:
+        benchmark.extra_info['bytes_per_second'] = (
+            byte_count / benchmark.stats.stats.mean
+        )
+
+
+def test_split_secret(benchmark, pytestconfig, secret_size, sharing):
+    threshold, share_count = sharing
+    cost = secret_size * threshold * share_count
+    skip_expensive(pytestconfig, cost)
+    secret = os.urandom(secret_size)
+    run(
+        benchmark, cost, len(secret),
+        split_secret, secret, threshold, share_count
+    )
+
+
+def test_recover_secret(benchmark, pytestconfig, secret_size, threshold):
+    cost = secret_size * threshold * threshold
+    skip_expensive(pytestconfig, cost)
+    secret = os.urandom(secret_size)
+    shares = split_secret(secret, threshold, threshold)
+    run(benchmark, cost, len(secret), recover_secret, shares)
+
+
+def test_add_share(benchmark, pytestconfig, secret_size, threshold):
+    cost = secret_size * threshold * threshold
+    skip_expensive(pytestconfig, cost)
+    secret = os.urandom(secret_size)
+    shares = split_secret(secret, threshold, threshold)
+    run(benchmark, cost, len(secret), add_share, shares, 255)
+
+
+def test_share_from_bytes(benchmark, pytestconfig, secret_size):
+    skip_expensive(pytestconfig, secret_size)
+    secret = os.urandom(secret_size)
+    binary = bytes(Share(2, 1, list(secret)))
+    run(benchmark, len(secret), len(secret), Share.from_bytes, binary)
+
+
+def test_share_bytes(benchmark, pytestconfig, secret_size):
+    skip_expensive(pytestconfig, secret_size)
+    secret = os.urandom(secret_size)
+    share = Share(2, 1, list(secret))
+    run(benchmark, len(secret), len(secret), bytes, share)
+
+
+def import_time(module):
+    """
+    Returns the time in microseconds it takes to import `module` in a new
+    process, as reported by ``python -X importtime``.
+    """
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        stderr=subprocess.STDOUT, universal_newlines=True
+    )
+    match = re.search(
+        r'^import time:\s+\d+ \|\s+(\d+) \| {}$'.format(re.escape(module)),
+        output, re.MULTILINE
+    )
+    return int(match.group(1))
+
+
+@pytest.mark.parametrize('statement', ['pass', 'import subrosa'])
+def test_startup(benchmark, statement):
+    if statement != 'pass':
+        benchmark.extra_info['import_time_us'] = import_time('subrosa')
+    benchmark.pedantic(
+        subprocess.check_call, ([sys.executable, '-c', statement],),
+        rounds=20
+    )
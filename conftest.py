@@ -18,6 +18,11 @@ def pytest_addoption(parser):
         '--all', action='store_true', default=False,
         help='Run all tests'
     )
+    parser.addoption(
+        '--benchmark-full', action='store_true', default=False,
+        help='Run benchmarks for all secret sizes, thresholds and share '
+             'counts, this takes hours'
+    )
 
 
 def pytest_configure(config):
@@ -45,5 +45,11 @@ if __name__ == '__main__':
             'Programming Language :: Python :: Implementation :: CPython'
         ],
         py_modules=['subrosa'],
-        install_requires=['gf256']
+        extras_require={
+            'gf256': ['gf256'],
+            'numpy': ['numpy']
+        },
+        entry_points={
+            'console_scripts': ['subrosa = subrosa:main']
+        }
     )
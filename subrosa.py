@@ -5,62 +5,739 @@
     :copyright: 2016 by Daniel Neuhäuser
     :license: BSD, see LICENSE.rst for details
 """
+import binascii
+import os
+import stat
 import struct
-from random import SystemRandom
+import sys
+from collections import OrderedDict, defaultdict, deque, namedtuple
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache, partial
+from time import perf_counter
 
-from gf256 import GF256
+# Importing this module should be fast, so that short-lived processes, such
+# as the command line interface, start quickly. Modules that are slow to
+# import and are only needed by some functions, are imported by those
+# functions.
 
 __version__ = '0.1.0'
 __version_info__ = (0, 1, 0)
 
-_random = SystemRandom()
 
+def _byte_view(buffer):
+    """
+    Returns a flat, unsigned byte :class:`memoryview` of `buffer`.
 
-def _create_random_polynomial(degree, free_coefficient):
-    coefficients = [GF256(free_coefficient)]
-    coefficients.extend([GF256(_random.randrange(256)) for _ in range(degree)])
-    return coefficients
+    `buffer` is only copied, if it's not contiguous, like a strided
+    memoryview.
+    """
+    view = memoryview(buffer)
+    if not view.c_contiguous:
+        view = memoryview(view.tobytes())
+    return view.cast('B')
 
 
-def _evaluate_polynomial(coefficients, x):
-    return sum(
-        (
-            coefficient * x ** GF256(exponent)
-            for exponent, coefficient in enumerate(coefficients)
-        ),
-        GF256(0)
-    )
+#: The :class:`Metrics` of all active :func:`collect_metrics` calls.
+_active_metrics = []
 
 
-def _split_secret_byte(secret, threshold, shares):
-    coefficients = _create_random_polynomial(threshold - 1, secret)
-    return [
-        (x, int(_evaluate_polynomial(coefficients, GF256(x))))
-        for x in range(1, shares + 1)
+class Metrics:
+    """
+    Timers and counters collected by :func:`collect_metrics`.
+
+    The following phases are timed:
+
+    `randomness`
+        Generating the random coefficients of the polynomials when splitting
+        a secret.
+    `evaluation`
+        Evaluating polynomials when splitting a secret.
+    `interpolation`
+        Interpolating when recovering a secret or adding a share.
+    `validation`
+        Checking that shares are compatible and sufficient.
+    `serialization`
+        Turning shares into byte strings.
+    `parsing`
+        Creating shares from byte strings.
+
+    The following counters are maintained:
+
+    `bytes_processed`
+        Number of secret bytes split, recovered or added as a share.
+    `bytes_serialized`, `bytes_parsed`
+        Number of bytes of binary shares created or parsed.
+    `field_operations`
+        Number of additions and multiplications in GF(256) performed on the
+        bytes of the secret.
+    `cache_hits`, `cache_misses`
+        Lookups of the Lagrange basis for a set of shares, which is cached
+        between calls.
+    """
+
+    def __init__(self):
+        #: Maps the name of a phase to the time spent in it in seconds.
+        self.timers = defaultdict(float)
+
+        #: Maps the name of a counter to its value.
+        self.counters = defaultdict(int)
+
+
+@contextmanager
+def collect_metrics(callback=None):
+    """
+    Collects metrics of all calls to this library while the returned context
+    manager is active and returns them as a :class:`Metrics` object:
+
+    >>> with collect_metrics() as metrics:
+    ...     shares = split_secret(b'secret', 2, 3)
+    >>> metrics.counters['bytes_processed']
+    6
+
+    Metrics are collected for all threads. If `callback` is given, it is
+    called with the :class:`Metrics` object on exit, use this to export the
+    metrics. Calls may be nested, in which case every active call collects
+    the metrics.
+
+    Metrics are only collected while this context manager is active. While
+    none is active, the instrumented code paths only check whether metrics
+    are collected, which adds less than a microsecond per call.
+    """
+    metrics = Metrics()
+    _active_metrics.append(metrics)
+    try:
+        yield metrics
+    finally:
+        _active_metrics.remove(metrics)
+        if callback is not None:
+            callback(metrics)
+
+
+class _Measurement:
+    def __init__(self, phase):
+        self.phase = phase
+        self.start = None
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = perf_counter() - self.start
+        for metrics in _active_metrics:
+            metrics.timers[self.phase] += duration
+
+
+class _NoMeasurement:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NO_MEASUREMENT = _NoMeasurement()
+
+
+def _measure(phase):
+    # Shared and stateless, so that nothing is allocated without metrics.
+    if not _active_metrics:
+        return _NO_MEASUREMENT
+    return _Measurement(phase)
+
+
+def _count(counter, value):
+    for metrics in _active_metrics:
+        metrics.counters[counter] += value
+
+
+#: The number of secret bytes processed by a backend at once.
+_BLOCK_SIZE = 64 * 1024
+
+#: The irreducible polynomial `x**8 + x**4 + x**3 + x + 1` used as a modulus
+#: for multiplication in GF(256), as in AES and the gf256 library.
+_IRREDUCIBLE_POLYNOMIAL = 0b100011011
+
+
+def _random_bytes(length):
+    return os.urandom(length)
+
+
+# The tables of powers of the generator `3` and their logarithms, which
+# allow multiplying and dividing elements of GF(256) with lookups. They are
+# embedded, instead of being computed, to keep importing this module fast.
+#
+# The table of powers is repeated, so that sums of two logarithms can be
+# looked up without reducing them modulo 255.
+_EXPONENTIALS = (
+    b'\x01\x03\x05\x0f\x11\x33\x55\xff\x1a\x2e\x72\x96\xa1\xf8\x13\x35'
+    b'\x5f\xe1\x38\x48\xd8\x73\x95\xa4\xf7\x02\x06\x0a\x1e\x22\x66\xaa'
+    b'\xe5\x34\x5c\xe4\x37\x59\xeb\x26\x6a\xbe\xd9\x70\x90\xab\xe6\x31'
+    b'\x53\xf5\x04\x0c\x14\x3c\x44\xcc\x4f\xd1\x68\xb8\xd3\x6e\xb2\xcd'
+    b'\x4c\xd4\x67\xa9\xe0\x3b\x4d\xd7\x62\xa6\xf1\x08\x18\x28\x78\x88'
+    b'\x83\x9e\xb9\xd0\x6b\xbd\xdc\x7f\x81\x98\xb3\xce\x49\xdb\x76\x9a'
+    b'\xb5\xc4\x57\xf9\x10\x30\x50\xf0\x0b\x1d\x27\x69\xbb\xd6\x61\xa3'
+    b'\xfe\x19\x2b\x7d\x87\x92\xad\xec\x2f\x71\x93\xae\xe9\x20\x60\xa0'
+    b'\xfb\x16\x3a\x4e\xd2\x6d\xb7\xc2\x5d\xe7\x32\x56\xfa\x15\x3f\x41'
+    b'\xc3\x5e\xe2\x3d\x47\xc9\x40\xc0\x5b\xed\x2c\x74\x9c\xbf\xda\x75'
+    b'\x9f\xba\xd5\x64\xac\xef\x2a\x7e\x82\x9d\xbc\xdf\x7a\x8e\x89\x80'
+    b'\x9b\xb6\xc1\x58\xe8\x23\x65\xaf\xea\x25\x6f\xb1\xc8\x43\xc5\x54'
+    b'\xfc\x1f\x21\x63\xa5\xf4\x07\x09\x1b\x2d\x77\x99\xb0\xcb\x46\xca'
+    b'\x45\xcf\x4a\xde\x79\x8b\x86\x91\xa8\xe3\x3e\x42\xc6\x51\xf3\x0e'
+    b'\x12\x36\x5a\xee\x29\x7b\x8d\x8c\x8f\x8a\x85\x94\xa7\xf2\x0d\x17'
+    b'\x39\x4b\xdd\x7c\x84\x97\xa2\xfd\x1c\x24\x6c\xb4\xc7\x52\xf6'
+) * 2
+_LOGARITHMS = (
+    b'\x00\x00\x19\x01\x32\x02\x1a\xc6\x4b\xc7\x1b\x68\x33\xee\xdf\x03'
+    b'\x64\x04\xe0\x0e\x34\x8d\x81\xef\x4c\x71\x08\xc8\xf8\x69\x1c\xc1'
+    b'\x7d\xc2\x1d\xb5\xf9\xb9\x27\x6a\x4d\xe4\xa6\x72\x9a\xc9\x09\x78'
+    b'\x65\x2f\x8a\x05\x21\x0f\xe1\x24\x12\xf0\x82\x45\x35\x93\xda\x8e'
+    b'\x96\x8f\xdb\xbd\x36\xd0\xce\x94\x13\x5c\xd2\xf1\x40\x46\x83\x38'
+    b'\x66\xdd\xfd\x30\xbf\x06\x8b\x62\xb3\x25\xe2\x98\x22\x88\x91\x10'
+    b'\x7e\x6e\x48\xc3\xa3\xb6\x1e\x42\x3a\x6b\x28\x54\xfa\x85\x3d\xba'
+    b'\x2b\x79\x0a\x15\x9b\x9f\x5e\xca\x4e\xd4\xac\xe5\xf3\x73\xa7\x57'
+    b'\xaf\x58\xa8\x50\xf4\xea\xd6\x74\x4f\xae\xe9\xd5\xe7\xe6\xad\xe8'
+    b'\x2c\xd7\x75\x7a\xeb\x16\x0b\xf5\x59\xcb\x5f\xb0\x9c\xa9\x51\xa0'
+    b'\x7f\x0c\xf6\x6f\x17\xc4\x49\xec\xd8\x43\x1f\x2d\xa4\x76\x7b\xb7'
+    b'\xcc\xbb\x3e\x5a\xfb\x60\xb1\x86\x3b\x52\xa1\x6c\xaa\x55\x29\x9d'
+    b'\x97\xb2\x87\x90\x61\xbe\xdc\xfc\xbc\x95\xcf\xcd\x37\x3f\x5b\xd1'
+    b'\x53\x39\x84\x3c\x41\xa2\x6d\x47\x14\x2a\x9e\x5d\x56\xf2\xd3\xab'
+    b'\x44\x11\x92\xd9\x23\x20\x2e\x89\xb4\x7c\xb8\x26\x77\x99\xe3\xa5'
+    b'\x67\x4a\xed\xde\xc5\x31\xfe\x18\x0d\x63\x8c\x80\xc0\xf7\x70\x07'
+)
+
+
+def _multiply(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return _EXPONENTIALS[_LOGARITHMS[a] + _LOGARITHMS[b]]
+
+
+def _divide(a, b):
+    if b == 0:
+        raise ZeroDivisionError()
+    if a == 0:
+        return 0
+    return _EXPONENTIALS[_LOGARITHMS[a] - _LOGARITHMS[b] + 255]
+
+
+@lru_cache(maxsize=256)
+def _multiplication_table(factor):
+    """
+    Returns a byte string containing the product of `factor` and every
+    element of GF(256), suitable for :meth:`bytes.translate`.
+    """
+    return bytes(_multiply(factor, element) for element in range(256))
+
+
+class Backend:
+    """
+    Base class for implementations of the arithmetic in GF(256), which
+    :func:`split_secret`, :func:`recover_secret` and :func:`add_share` are
+    built upon. Subclasses are made available with :func:`register_backend`.
+
+    Backends operate on blocks of a secret at once. Arguments are bytes-like
+    objects, such as :class:`bytes` or :class:`memoryview`, so that blocks
+    of the secret are passed without copying them. Every bytes-like object
+    passed to or returned from a backend has the same length, with one byte
+    for every byte of the block.
+    """
+
+    #: The name used to select the backend with :func:`set_backend` and the
+    #: :envvar:`SUBROSA_BACKEND` environment variable.
+    name = None
+
+    #: The minimum length of a secret for which the backend is selected
+    #: automatically. If several backends qualify, the one with the largest
+    #: minimum is used. Backends with `None` are never selected
+    #: automatically.
+    auto_min_size = None
+
+    def is_available(self):
+        """
+        Returns `True`, if the backend can be used. Override this, if the
+        backend depends on optional packages.
+        """
+        return True
+
+    def evaluate(self, coefficients, xs):
+        """
+        Evaluates polynomials at each of the integers `xs`.
+
+        `coefficients` is a list of bytes-like objects. The polynomial for the
+        i-th byte of the block has the i-th bytes of these objects as its
+        coefficients, starting with the free coefficient.
+
+        Returns a list with a byte string for every x.
+        """
+        raise NotImplementedError()
+
+    def interpolate(self, basis, ys):
+        """
+        Returns the sum of the bytes-like objects `ys`, each multiplied with
+        the corresponding integer in `basis`, as a byte string.
+        """
+        raise NotImplementedError()
+
+    def interpolate_into(self, basis, ys, out):
+        """
+        Like :meth:`interpolate` but writes the result into `out`, a writable
+        byte :class:`memoryview`.
+
+        The default implementation copies the result of :meth:`interpolate`.
+        Override this, if the backend can write into `out` directly.
+        """
+        out[:] = self.interpolate(basis, ys)
+
+
+class _GF256Backend(Backend):
+    """
+    Uses the objects of the gf256 library. This is the slowest backend, it's
+    kept as a reference for the other backends.
+    """
+    name = 'gf256'
+
+    def is_available(self):
+        try:
+            import gf256  # noqa
+        except ImportError:
+            return False
+        return True
+
+    def evaluate(self, coefficients, xs):
+        from gf256 import GF256
+        results = []
+        for x in map(GF256, xs):
+            ys = []
+            for column in zip(*coefficients):
+                # Horner's method
+                y = GF256(0)
+                for coefficient in reversed(column):
+                    y = y * x + GF256(coefficient)
+                ys.append(int(y))
+            results.append(bytes(ys))
+        return results
+
+    def interpolate(self, basis, ys):
+        result = bytearray(len(ys[0]))
+        self.interpolate_into(basis, ys, memoryview(result))
+        return bytes(result)
+
+    def interpolate_into(self, basis, ys, out):
+        from gf256 import GF256
+        basis = [GF256(l_j) for l_j in basis]
+        for i, column in enumerate(zip(*ys)):
+            y = GF256(0)
+            for l_j, y_j in zip(basis, column):
+                y += l_j * GF256(y_j)
+            out[i] = int(y)
+
+
+class _TableBackend(Backend):
+    """
+    Multiplies every byte in pure Python using multiplication tables.
+    """
+    name = 'table'
+
+    def evaluate(self, coefficients, xs):
+        results = []
+        for x in xs:
+            table = _multiplication_table(x)
+            # Horner's method
+            ys = bytearray(coefficients[-1])
+            for row in reversed(coefficients[:-1]):
+                for i, coefficient in enumerate(row):
+                    ys[i] = table[ys[i]] ^ coefficient
+            results.append(bytes(ys))
+        return results
+
+    def interpolate(self, basis, ys):
+        result = bytearray(len(ys[0]))
+        for l_j, y_j in zip(basis, ys):
+            table = _multiplication_table(l_j)
+            for i, y in enumerate(y_j):
+                result[i] ^= table[y]
+        return bytes(result)
+
+    def interpolate_into(self, basis, ys, out):
+        # Slower than interpolate, because indexing a memoryview is.
+        out[:] = bytes(len(out))
+        for l_j, y_j in zip(basis, ys):
+            table = _multiplication_table(l_j)
+            for i, y in enumerate(y_j):
+                out[i] ^= table[y]
+
+
+class _TranslateBackend(Backend):
+    """
+    Multiplies whole blocks by a constant with :meth:`bytes.translate` and
+    adds them by exclusive or on integers.
+    """
+    name = 'translate'
+    auto_min_size = 0
+
+    def evaluate(self, coefficients, xs):
+        length = len(coefficients[0])
+        rows = [int.from_bytes(row, 'little') for row in coefficients[:-1]]
+        results = []
+        for x in xs:
+            table = _multiplication_table(x)
+            # Horner's method
+            ys = bytes(coefficients[-1])
+            for row in reversed(rows):
+                ys = (
+                    int.from_bytes(ys.translate(table), 'little') ^ row
+                ).to_bytes(length, 'little')
+            results.append(ys)
+        return results
+
+    def interpolate(self, basis, ys):
+        result = 0
+        for l_j, y_j in zip(basis, ys):
+            # Only bytes and bytearray have translate, bytes(y_j) doesn't
+            # copy byte strings.
+            if not isinstance(y_j, (bytes, bytearray)):
+                y_j = bytes(y_j)
+            result ^= int.from_bytes(
+                y_j.translate(_multiplication_table(l_j)), 'little'
+            )
+        return result.to_bytes(len(ys[0]), 'little')
+
+
+class _NumPyBackend(Backend):
+    """
+    Multiplies whole blocks by a constant by indexing NumPy arrays.
+    """
+    name = 'numpy'
+    auto_min_size = 16 * 1024
+
+    def is_available(self):
+        try:
+            import numpy  # noqa
+        except ImportError:
+            return False
+        return True
+
+    def _multiplication_table(self, factor):
+        import numpy
+        return numpy.frombuffer(_multiplication_table(factor), numpy.uint8)
+
+    def evaluate(self, coefficients, xs):
+        import numpy
+        rows = [numpy.frombuffer(row, numpy.uint8) for row in coefficients]
+        results = []
+        for x in xs:
+            table = self._multiplication_table(x)
+            # Horner's method
+            ys = rows[-1]
+            for row in reversed(rows[:-1]):
+                ys = numpy.take(table, ys)
+                ys ^= row
+            results.append(ys.tobytes())
+        return results
+
+    def interpolate(self, basis, ys):
+        result = bytearray(len(ys[0]))
+        self.interpolate_into(basis, ys, memoryview(result))
+        return bytes(result)
+
+    def interpolate_into(self, basis, ys, out):
+        import numpy
+        result = numpy.frombuffer(out, numpy.uint8)
+        result[:] = 0
+        product = numpy.empty_like(result)
+        for l_j, y_j in zip(basis, ys):
+            numpy.take(
+                self._multiplication_table(l_j),
+                numpy.frombuffer(y_j, numpy.uint8),
+                out=product
+            )
+            result ^= product
+
+
+#: Maps the names of all registered backends to the backends.
+_backends = OrderedDict()
+
+#: The name of the backend selected with :func:`set_backend` or `None`, if
+#: the :envvar:`SUBROSA_BACKEND` environment variable hasn't been consulted
+#: yet.
+_backend_name = None
+
+
+def register_backend(backend):
+    """
+    Registers `backend`, an instance of a :class:`Backend` subclass, so that
+    it can be selected with :func:`set_backend` and is considered by the
+    automatic selection and :func:`check_backends`.
+    """
+    _backends[backend.name] = backend
+
+
+for _backend in [
+    _GF256Backend(), _TableBackend(), _TranslateBackend(), _NumPyBackend()
+]:
+    register_backend(_backend)
+del _backend
+
+
+def set_backend(name):
+    """
+    Selects the backend used for all further calls. `name` is the name of a
+    registered backend or `'auto'`, which selects the fastest available
+    backend depending on the length of the secret.
+
+    Unless this function is called, the backend is selected by the
+    :envvar:`SUBROSA_BACKEND` environment variable, if it is set, or
+    automatically.
+
+    Raises a :exc:`ValueError`, if there is no backend with the given name or
+    the backend is not available.
+    """
+    global _backend_name
+    if name != 'auto':
+        if name not in _backends:
+            raise ValueError('unknown backend: {}'.format(name))
+        if not _backends[name].is_available():
+            raise ValueError('backend not available: {}'.format(name))
+    _backend_name = name
+
+
+def get_backend(size=0):
+    """
+    Returns the :class:`Backend` used for a secret of `size` bytes.
+
+    Raises a :exc:`RuntimeError`, if the :envvar:`SUBROSA_BACKEND`
+    environment variable names an unknown or unavailable backend.
+    """
+    if _backend_name is None:
+        try:
+            set_backend(os.environ.get('SUBROSA_BACKEND', 'auto'))
+        except ValueError as exc:
+            # A misconfiguration, not a problem with the arguments.
+            raise RuntimeError(
+                'invalid SUBROSA_BACKEND environment variable, {}'.format(exc)
+            ) from exc
+    if _backend_name != 'auto':
+        return _backends[_backend_name]
+    candidates = [
+        backend for backend in _backends.values()
+        if backend.auto_min_size is not None and
+        backend.auto_min_size <= size and
+        backend.is_available()
     ]
+    return max(candidates, key=lambda backend: backend.auto_min_size)
+
+
+def check_backends(secret=bytes(range(256)), threshold=3, share_count=5,
+                   seed=0):
+    """
+    Checks that all available backends produce identical results.
+
+    With every backend, `secret` is split into shares using a random number
+    generator seeded with `seed`, the secret is recovered from the last
+    `threshold` shares and a new share is added. Use this to make sure a
+    backend can be safely used, before selecting it.
+
+    Returns a list of the names of the checked backends.
+
+    Raises a :exc:`RuntimeError`, if a backend fails to recover the secret or
+    produces different shares than the other backends.
+    """
+    from random import Random
+    results = []
+    for backend in _backends.values():
+        if not backend.is_available():
+            continue
+        generator = Random(seed)
+        shares = _split(
+            _byte_view(secret), threshold, share_count, backend,
+            lambda length: generator.getrandbits(8 * length).to_bytes(
+                length, 'little'
+            )
+        )
+        recovered = b''.join(_interpolate(shares[-threshold:], 0, backend))
+        if recovered != secret:
+            raise RuntimeError(
+                'backend {} failed to recover the secret'.format(backend.name)
+            )
+        added = b''.join(_interpolate(shares, 255, backend))
+        results.append(
+            (backend.name, [bytes(share) for share in shares], added)
+        )
+    reference_name, reference_shares, reference_added = results[0]
+    for name, shares, added in results[1:]:
+        if shares != reference_shares or added != reference_added:
+            raise RuntimeError(
+                'backend {} disagrees with backend {}'.format(
+                    name, reference_name
+                )
+            )
+    return [name for name, _, _ in results]
 
 
-def _lagrange_interpolation(points, x):
-    y = GF256(0)
-    for j in range(len(points)):
-        l = GF256(1)
-        for m in range(len(points)):
+@lru_cache(maxsize=64)
+def _lagrange_basis(xs, x):
+    """
+    Returns the Lagrange basis polynomials for the points with the x
+    coordinates `xs` evaluated at `x`.
+
+    The value of the interpolated polynomial at `x` is the sum of the y
+    coordinates multiplied with the corresponding basis polynomial. The basis
+    only depends on the x coordinates, so it's the same for every byte of a
+    secret.
+    """
+    basis = []
+    for j, x_j in enumerate(xs):
+        l_j = 1
+        for m, x_m in enumerate(xs):
             if m != j:
-                l *= (x - points[m][0]) / (points[j][0] - points[m][0])
-        y += points[j][1] * l
-    return y
+                l_j = _multiply(l_j, _divide(x ^ x_m, x_j ^ x_m))
+        basis.append(l_j)
+    return tuple(basis)
 
 
-def _recover_secret_byte(shares):
-    return int(_lagrange_interpolation(
-        [(GF256(x), GF256(y)) for x, y in shares],
-        GF256(0))
-    )
+def _evaluate_random_polynomials(free_coefficients, degree, xs, backend,
+                                 random_bytes):
+    """
+    Evaluates random polynomials of the given `degree`, one for each byte of
+    the `free_coefficients`, at each of the `xs`.
+
+    Returns a list of byte strings, one for each x.
+    """
+    length = len(free_coefficients)
+    with _measure('randomness'):
+        random_coefficients = random_bytes(length * degree)
+    with _measure('evaluation'):
+        coefficients = [free_coefficients]
+        coefficients.extend(
+            random_coefficients[i * length:(i + 1) * length]
+            for i in range(degree)
+        )
+        return backend.evaluate(coefficients, xs)
+
+
+def _xor(a, b):
+    return (
+        int.from_bytes(a, 'little') ^ int.from_bytes(b, 'little')
+    ).to_bytes(len(a), 'little')
+
+
+def _split(secret, threshold, share_count, backend, random_bytes):
+    secret_id = random_bytes(_SECRET_ID_LENGTH)
+    shares = [
+        Share(threshold, x, bytearray(), secret_id)
+        for x in range(1, share_count + 1)
+    ]
+    xs = [share.x for share in shares]
+    degree = threshold - 1
+    for start in range(0, len(secret), _BLOCK_SIZE):
+        block_ys = _evaluate_random_polynomials(
+            secret[start:start + _BLOCK_SIZE], degree, xs, backend,
+            random_bytes
+        )
+        for share, ys in zip(shares, block_ys):
+            share._ys += ys
+    _count('bytes_processed', len(secret))
+    _count('field_operations', 2 * degree * share_count * len(secret))
+    return shares
+
+
+def _refresh(share_sets, backend, random_bytes):
+    """
+    Refreshes `share_sets`, which all have the same threshold and x
+    coordinates in the same order, in a single pass.
+
+    The y values of each share are concatenated across all sets, so that
+    the backend can process all secrets at once. This works, because every
+    byte of a secret is shared with an independent polynomial.
+    """
+    threshold = share_sets[0][0]._threshold
+    xs = [share.x for share in share_sets[0]]
+    lengths = [len(shares[0]._ys) for shares in share_sets]
+    columns = [
+        b''.join(shares[i]._ys for shares in share_sets)
+        for i in range(len(xs))
+    ]
+    refreshed_columns = [bytearray() for _ in xs]
+    for start in range(0, sum(lengths), _BLOCK_SIZE):
+        length = len(columns[0][start:start + _BLOCK_SIZE])
+        deltas = _evaluate_random_polynomials(
+            bytes(length), threshold - 1, xs, backend, random_bytes
+        )
+        with _measure('evaluation'):
+            for refreshed, column, delta in zip(
+                refreshed_columns, columns, deltas
+            ):
+                refreshed += _xor(column[start:start + length], delta)
+    _count('bytes_processed', sum(lengths))
+    _count('field_operations', (2 * threshold - 1) * len(xs) * sum(lengths))
+    refreshed_sets = []
+    start = 0
+    for shares, length in zip(share_sets, lengths):
+        # A new id keeps old and new shares from being mixed up.
+        secret_id = None
+        if shares[0].secret_id is not None:
+            secret_id = random_bytes(_SECRET_ID_LENGTH)
+        refreshed_sets.append([
+            Share(
+                threshold, x, refreshed[start:start + length],
+                secret_id
+            )
+            for x, refreshed in zip(xs, refreshed_columns)
+        ])
+        start += length
+    return refreshed_sets
+
+
+def _interpolate(shares, x, backend):
+    """
+    Yields blocks of the values at `x` of the polynomials interpolated for
+    each byte of the secret `shares` refer to.
+    """
+    basis = _interpolation_basis(shares, x)
+    for ys in _share_blocks(shares):
+        yield backend.interpolate(basis, ys)
+
+
+def _interpolate_into(shares, x, backend, out):
+    """
+    Like :func:`_interpolate` but writes the values into the memoryview
+    `out`.
+    """
+    basis = _interpolation_basis(shares, x)
+    start = 0
+    for ys in _share_blocks(shares):
+        length = len(ys[0])
+        backend.interpolate_into(basis, ys, out[start:start + length])
+        start += length
 
 
-def _add_share_byte(shares, x):
-    points = [(GF256(x), GF256(y)) for x, y in shares]
-    return int(_lagrange_interpolation(points, GF256(x)))
+def _interpolation_basis(shares, x):
+    xs = tuple(share.x for share in shares)
+    if _active_metrics:
+        hits = _lagrange_basis.cache_info().hits
+        basis = _lagrange_basis(xs, x)
+        hit = _lagrange_basis.cache_info().hits - hits
+        _count('cache_hits', hit)
+        _count('cache_misses', 1 - hit)
+        _count('bytes_processed', len(shares[0]._ys))
+        _count('field_operations', 2 * len(shares) * len(shares[0]._ys))
+    else:
+        basis = _lagrange_basis(xs, x)
+    return basis
+
+
+def _share_blocks(shares):
+    """
+    Yields lists with a block of the y values of each of the `shares`.
+    """
+    views = [memoryview(share._ys) for share in shares]
+    for start in range(0, len(views[0]), _BLOCK_SIZE):
+        yield [view[start:start + _BLOCK_SIZE] for view in views]
+
+
+#: The length of the random identifier, shares of the same secret have in
+#: common.
+_SECRET_ID_LENGTH = 8
 
 
 class Share:
@@ -69,14 +746,28 @@ class Share:
 
     Can be turned into a byte string using :func:`bytes`. Use this along with
     :meth:`from_bytes` to store shares.
+
+    Shares created by :func:`split_secret` carry a random identifier of the
+    secret, they share, as :attr:`secret_id`. Shares stored in version 1 of
+    the binary format don't have one, their :attr:`secret_id` is `None`.
     """
+
+    #: Maps the versions of the binary format to the length of the header
+    #: preceding the y values. The header consists of the version, threshold
+    #: and x, version 2 adds the secret id.
+    _header_lengths = {1: 3, 2: 3 + _SECRET_ID_LENGTH}
+
+    #: The version of the binary format used by :func:`bytes`. Shares with a
+    #: :attr:`secret_id` use version 2.
     version = 1
 
     @classmethod
     def from_bytes(cls, bytestring):
         """
         Returns a `Share` instance given a byte string representation of a
-        share.
+        share. Any object supporting the buffer protocol, such as a
+        :class:`bytearray`, :class:`memoryview` or :class:`mmap.mmap`, can be
+        passed instead of a byte string.
 
         This method will raise a :exc:`NotImplementedError`, if the byte string
         was generated with a newer version of this library (or the byte string
@@ -85,55 +776,103 @@ class Share:
         This method will raise a :exc:`ValueError`, if the byte string is not
         a valid share.
         """
+        if not _active_metrics:
+            return cls._from_view(_byte_view(bytestring))
+        with _measure('parsing'):
+            view = _byte_view(bytestring)
+            share = cls._from_view(view)
+        _count('bytes_parsed', len(view))
+        return share
+
+    @classmethod
+    def _from_view(cls, view):
         try:
-            version = struct.unpack('>B', bytestring[:1])[0]
-            if version != cls.version:
+            version, = struct.unpack_from('>B', view)
+            if version not in cls._header_lengths:
                 raise NotImplementedError(
                     'unsupported version: {}'.format(version)
                 )
-            threshold, x = struct.unpack(
-                '>BB',
-                bytestring[1:3]
-            )
-            ys = list(struct.unpack(
-                '>B' + 'B' * (len(bytestring) - 4),
-                bytestring[3:]
-            ))
+            threshold, x = struct.unpack_from('>BB', view, 1)
         except struct.error as exc:
             raise ValueError('invalid share format') from exc
-        return cls(threshold, x, ys)
+        header_length = cls._header_lengths[version]
+        if len(view) <= header_length:
+            raise ValueError('invalid share format')
+        secret_id = None
+        if version >= 2:
+            secret_id = view[3:header_length].tobytes()
+        ys = view[header_length:].tobytes()
+        return cls(threshold, x, ys, secret_id)
 
-    def __init__(self, threshold, x, ys):
+    def __init__(self, threshold, x, ys, secret_id=None):
         self._threshold = threshold
         self.x = x
+        # Stored as bytes, a list of integers takes eight times the memory.
+        if not isinstance(ys, (bytes, bytearray)):
+            ys = bytes(ys)
         self._ys = ys
+        self.secret_id = secret_id
 
     @property
-    def _points(self):
-        return [(self.x, y) for y in self._ys]
-
-    def _is_compatible_with(self, other):
-        return (
-            self.version == other.version and
-            self._threshold == other._threshold and
-            self.x != other.x and
-            len(self._ys) == len(other._ys)
-        )
+    def secret_id(self):
+        """
+        A byte string of 8 bytes identifying the secret, this share is a share
+        of, or `None`. Assigning `None` makes the share use version 1 of the
+        binary format, assigning an identifier version 2.
+
+        A :exc:`ValueError` is raised, if an identifier of a different length
+        is assigned.
+        """
+        return self._secret_id
+
+    @secret_id.setter
+    def secret_id(self, secret_id):
+        if secret_id is None:
+            # Falls back to the class attribute.
+            self.__dict__.pop('version', None)
+        elif len(secret_id) != _SECRET_ID_LENGTH:
+            raise ValueError(
+                'secret_id must be {} bytes long'.format(_SECRET_ID_LENGTH)
+            )
+        else:
+            self.version = 2
+        self._secret_id = secret_id
+
+    @property
+    def _fingerprint(self):
+        """
+        Shares of the same secret have the same fingerprint.
+        """
+        return self.version, self._threshold, len(self._ys), self.secret_id
 
     def __bytes__(self):
-        return struct.pack(
-            '>BBB' + 'B' * len(self._ys),
-            self.version,
-            self._threshold,
-            self.x,
-            *self._ys
-        )
+        if not _active_metrics:
+            return self._to_bytes()
+        with _measure('serialization'):
+            binary = self._to_bytes()
+        _count('bytes_serialized', len(binary))
+        return binary
+
+    def _to_bytes(self):
+        header = struct.pack('>BBB', self.version, self._threshold, self.x)
+        if self.secret_id is not None:
+            header += self.secret_id
+        return header + self._ys
+
+
+def _check_split_arguments(threshold, share_count):
+    if not 2 <= threshold < 256:
+        raise ValueError('threshold out of range(2, 256)')
+    if not (threshold <= share_count < 256):
+        raise ValueError('share_count out of range(threshold, 256)')
 
 
 def split_secret(secret, threshold, share_count):
     """
-    Splits up the `secret`, a byte string, into `share_count` shares from which
-    the `secret` can be recovered with at least `threshold` shares.
+    Splits up the `secret`, a byte string or any other object supporting the
+    buffer protocol, into `share_count` shares from which the `secret` can be
+    recovered with at least `threshold` shares. Contiguous buffers are used
+    without copying them, others are copied first.
 
     Returns a list of :class:`Share` objects, each representing a share.
 
@@ -151,29 +890,38 @@ def split_secret(secret, threshold, share_count):
     A :exc:`ValueError` will be raised, if `secret` is an empty string or if
     `threshold` or `share_count` has a value outside of the allowed range.
     """
+    secret = _byte_view(secret)
     if not secret:
         raise ValueError("can't split empty secret")
-    if not 2 <= threshold < 256:
-        raise ValueError('threshold out of range(2, 256)')
-    if not (threshold <= share_count < 256):
-        raise ValueError('share_count out of range(threshold, 256)')
+    _check_split_arguments(threshold, share_count)
 
-    shares = [Share(threshold, x, []) for x in range(1, share_count + 1)]
-    for byte in secret:
-        byte_shares = _split_secret_byte(byte, threshold, share_count)
-        assert len(byte_shares) == share_count
-        for share, (_, y) in zip(shares, byte_shares):
-            share._ys.append(y)
-    return shares
+    return _split(
+        secret, threshold, share_count, get_backend(len(secret)), _random_bytes
+    )
 
 
 def _validate_shares(shares):
+    with _measure('validation'):
+        _check_shares(shares)
+
+
+def _check_shares(shares):
     if not shares:
         raise ValueError('insufficient number of shares')
 
     first = shares[0]
-    if not all(first._is_compatible_with(share) for share in shares[1:]):
-        raise ValueError('incompatible shares')
+    for share in shares[1:]:
+        for name, expected, actual in zip(
+            ['versions', 'thresholds', 'lengths', 'secret ids'],
+            first._fingerprint,
+            share._fingerprint
+        ):
+            if expected != actual:
+                raise ValueError(
+                    'incompatible shares, different {}'.format(name)
+                )
+    if len({share.x for share in shares}) != len(shares):
+        raise ValueError('incompatible shares, duplicate x')
     if first._threshold > len(shares):
         raise ValueError(
             'insufficient number of shares, {} shares required'.format(
@@ -191,10 +939,48 @@ def recover_secret(shares):
     possibly refer to the same secret) a :exc:`ValueError` is raised.
     """
     _validate_shares(shares)
-    return bytes(
-        _recover_secret_byte(byte_share)
-        for byte_share in zip(*(share._points for share in shares))
-    )
+    backend = get_backend(len(shares[0]._ys))
+    with _measure('interpolation'):
+        return b''.join(_interpolate(shares, 0, backend))
+
+
+def recover_secret_into(shares, out_buffer):
+    """
+    Recovers a secret from the given `shares` like :func:`recover_secret` but
+    writes it into `out_buffer` instead of returning a new byte string.
+
+    `out_buffer` must be a writable object supporting the buffer protocol,
+    such as a :class:`bytearray`, :class:`memoryview` or :class:`mmap.mmap`,
+    that is at least as long as the secret. This allows recovering the secret
+    into memory you control. The table, gf256 and numpy backends compute the
+    secret in place. The translate backend, which is selected automatically
+    for secrets below 16 KiB or if numpy isn't installed, holds each block
+    as an intermediate integer and byte string before copying it into
+    `out_buffer`.
+
+    Returns the number of bytes written to `out_buffer`.
+
+    In addition to the errors raised by :func:`recover_secret`, a
+    :exc:`TypeError` is raised, if `out_buffer` is read-only and a
+    :exc:`ValueError` is raised, if `out_buffer` is not contiguous or too
+    small to hold the secret.
+    """
+    _validate_shares(shares)
+    out = memoryview(out_buffer)
+    if out.readonly:
+        raise TypeError('out_buffer is read-only')
+    if not out.c_contiguous:
+        raise ValueError('out_buffer is not contiguous')
+    out = out.cast('B')
+    secret_length = len(shares[0]._ys)
+    if len(out) < secret_length:
+        raise ValueError(
+            'out_buffer too small, {} bytes required'.format(secret_length)
+        )
+    backend = get_backend(secret_length)
+    with _measure('interpolation'):
+        _interpolate_into(shares, 0, backend, out[:secret_length])
+    return secret_length
 
 
 def add_share(shares, x):
@@ -230,11 +1016,533 @@ def add_share(shares, x):
     _validate_shares(shares)
     if not (1 <= x < 256):
         raise ValueError('x not in range(1, 256)')
-    return Share(
-        shares[0]._threshold,
-        x,
-        [
-            _add_share_byte(byte_share, x)
-            for byte_share in zip(*(share._points for share in shares))
-        ]
+    backend = get_backend(len(shares[0]._ys))
+    ys = bytearray(len(shares[0]._ys))
+    with _measure('interpolation'):
+        _interpolate_into(shares, x, backend, memoryview(ys))
+    return Share(shares[0]._threshold, x, ys, shares[0].secret_id)
+
+
+def refresh_shares(shares):
+    """
+    Returns new shares for the same secret as `shares`, without recovering
+    the secret.
+
+    This is done by adding the values of random polynomials, whose free
+    coefficient is zero, to the shares. The new shares are independent of
+    the old ones, so that old shares leaked before the refresh, can't be
+    combined with new shares leaked afterwards.
+
+    >>> shares = split_secret(b'secret', 2, 3)
+    >>> refreshed_shares = refresh_shares(shares)
+    >>> recover_secret(refreshed_shares[1:])
+    b'secret'
+
+    Old and new shares can't be combined to recover the secret. Make sure to
+    refresh all shares in circulation at once and to replace all of them.
+    The new shares get a new secret id, so :func:`recover_secret` rejects
+    and :func:`group_shares` separates a mix of old and new shares.
+
+    If not enough shares are provided or the shares are incompatible a
+    :exc:`ValueError` is raised.
+    """
+    return refresh_share_sets([shares])[0]
+
+
+def refresh_share_sets(share_sets):
+    """
+    Like :func:`refresh_shares` but refreshes several sets of shares, each
+    referring to a different secret, at once. Sets with the same threshold
+    and the same x coordinates (in the same order) are refreshed together in
+    a single pass, which is much faster than refreshing them one at a time.
+
+    Returns a list with the refreshed shares for each of the `share_sets`.
+    """
+    share_sets = list(share_sets)
+    groups = OrderedDict()
+    for index, shares in enumerate(share_sets):
+        _validate_shares(shares)
+        key = (shares[0]._threshold, tuple(share.x for share in shares))
+        groups.setdefault(key, []).append(index)
+    refreshed_sets = [None] * len(share_sets)
+    for indices in groups.values():
+        group = [share_sets[index] for index in indices]
+        backend = get_backend(
+            sum(len(shares[0]._ys) for shares in group)
+        )
+        refreshed_group = _refresh(group, backend, _random_bytes)
+        for index, refreshed in zip(indices, refreshed_group):
+            refreshed_sets[index] = refreshed
+    return refreshed_sets
+
+
+#: The result of :func:`group_shares`.
+ShareGroups = namedtuple(
+    'ShareGroups', ['groups', 'incomplete', 'duplicates', 'conflicts']
+)
+
+
+def group_shares(shares):
+    """
+    Sorts a pool of `shares`, possibly of many different secrets, into
+    groups of shares of the same secret.
+
+    Shares are grouped by their version, threshold, length and
+    :attr:`~Share.secret_id`. Shares without a secret id can't be told apart
+    by secret, if they agree in all other respects, so they may end up in
+    the same group although they belong to different secrets. Such mixups
+    usually show up as conflicts.
+
+    Returns a :class:`ShareGroups` named tuple with the following lists:
+
+    `groups`
+        Lists of shares, each of which can be passed to
+        :func:`recover_secret`.
+    `incomplete`
+        Lists of shares of the same secret, that don't reach the threshold.
+    `duplicates`
+        Shares, that are identical to shares in `groups`, `incomplete` or
+        `conflicts`, and were left out of them.
+    `conflicts`
+        Lists of shares, that have the same secret and x but differing y
+        values. These shares are not included in `groups` or `incomplete`,
+        because it is unknown, which one of them is valid.
+
+    This takes linear time in the number of shares.
+
+    >>> shares_a = split_secret(b'secret', 2, 3)
+    >>> shares_b = split_secret(b'other secret', 2, 3)
+    >>> result = group_shares(shares_a[:2] + shares_b + shares_a[:1])
+    >>> [recover_secret(group) for group in result.groups]
+    [b'secret', b'other secret']
+    >>> result.duplicates == shares_a[:1]
+    True
+    """
+    with _measure('validation'):
+        buckets = OrderedDict()
+        for share in shares:
+            bucket = buckets.setdefault(share._fingerprint, OrderedDict())
+            variants = bucket.setdefault(share.x, OrderedDict())
+            variants.setdefault(bytes(share._ys), []).append(share)
+
+        result = ShareGroups([], [], [], [])
+        for (_, threshold, _, _), bucket in buckets.items():
+            group = []
+            for variants in bucket.values():
+                unique_shares = []
+                for same_shares in variants.values():
+                    unique_shares.append(same_shares[0])
+                    result.duplicates.extend(same_shares[1:])
+                if len(unique_shares) == 1:
+                    group.append(unique_shares[0])
+                else:
+                    result.conflicts.append(unique_shares)
+            if len(group) >= threshold:
+                result.groups.append(group)
+            elif group:
+                result.incomplete.append(group)
+    return result
+
+
+#: The number of secret bytes the command line interface processes at once, by
+#: default.
+_DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def _share_header_length(version):
+    """
+    Returns the length of the header preceding the y values of a binary
+    share in the given format `version`.
+    """
+    # Unknown versions are rejected by Share.from_bytes, they only need to
+    # be read far enough for that.
+    return Share._header_lengths.get(version, 3)
+
+
+class _Stats:
+    """
+    Collects the time spent in each phase of a command and the number of
+    secret bytes processed, for ``--stats``.
+
+    Phases may be nested, the time spent in a nested phase is not accounted
+    to the enclosing one.
+    """
+
+    def __init__(self):
+        self.phases = OrderedDict()
+        self.byte_count = 0
+        self._stack = []
+        self._start = perf_counter()
+
+    @contextmanager
+    def measure(self, phase):
+        self.phases.setdefault(phase, 0.0)
+        frame = [perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            duration = perf_counter() - frame[0]
+            self.phases[phase] += duration - frame[1]
+            if self._stack:
+                self._stack[-1][1] += duration
+
+    def report(self, file):
+        total = perf_counter() - self._start
+        for phase, duration in self.phases.items():
+            print('{:<10} {:.6f}s'.format(phase, duration), file=file)
+        print(
+            '{:<10} {:.6f}s {} bytes {:.1f} bytes/s'.format(
+                'total', total, self.byte_count,
+                self.byte_count / total if total else 0.0
+            ),
+            file=file
+        )
+
+
+def _imap(function, iterable, workers):
+    """
+    Like :func:`map` but distributes the calls among `workers` processes,
+    if `workers` is greater than 1.
+
+    Unlike :meth:`concurrent.futures.Executor.map` only a bounded number of
+    items is consumed ahead of the results, so that `iterable` can be streamed.
+    """
+    if workers == 1:
+        yield from map(function, iterable)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        for item in iterable:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _timed_iter(iterable, stats, phase):
+    iterator = iter(iterable)
+    while True:
+        with stats.measure(phase):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def _read_chunks(file, chunk_size, stats):
+    while True:
+        with stats.measure('read'):
+            chunk = file.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _read_share_header(file):
+    header = file.read(1)
+    if header:
+        header += file.read(_share_header_length(header[0]) - 1)
+    return header
+
+
+def _read_share_chunks(files, chunk_size, stats):
+    """
+    Yields lists of binary shares, one for each of the given share `files`,
+    each covering the same `chunk_size` bytes of the secret.
+    """
+    with stats.measure('read'):
+        headers = [_read_share_header(file) for file in files]
+    first = True
+    while True:
+        with stats.measure('read'):
+            chunks = [file.read(chunk_size) for file in files]
+        if not (first or any(chunks)):
+            return
+        first = False
+        yield [header + chunk for header, chunk in zip(headers, chunks)]
+
+
+def _split_chunk(chunk, threshold, share_count):
+    return [
+        bytes(share) for share in split_secret(chunk, threshold, share_count)
+    ]
+
+
+def _recover_chunk(binary_shares):
+    return recover_secret(
+        [Share.from_bytes(binary_share) for binary_share in binary_shares]
+    )
+
+
+def _add_share_chunk(binary_shares, x):
+    shares = [Share.from_bytes(binary_share) for binary_share in binary_shares]
+    return bytes(add_share(shares, x))
+
+
+def _write_share_chunk(file, binary_share, first):
+    """
+    Writes a `binary_share` covering a chunk of the secret to `file`. The
+    header is only written for the `first` chunk.
+    """
+    if first:
+        file.write(binary_share)
+    else:
+        file.write(
+            memoryview(binary_share)[_share_header_length(binary_share[0]):]
+        )
+
+
+def _open_input(path, stack):
+    if path == '-':
+        return sys.stdin.buffer
+    return stack.enter_context(open(path, 'rb'))
+
+
+def _open_output(path, stack):
+    if path == '-':
+        return sys.stdout.buffer
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        mode = None
+    if mode is None or stat.S_ISREG(mode):
+        return stack.enter_context(_replacing_file(os.path.realpath(path)))
+    # Pipes and devices can't be replaced, without destroying them.
+    return stack.enter_context(open(path, 'wb'))
+
+
+@contextmanager
+def _replacing_file(path):
+    """
+    Yields a temporary file, which replaces the file at `path`, once the
+    block has been left without an error. Otherwise the temporary file is
+    removed and an existing file at `path` is left untouched.
+    """
+    import tempfile
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, temporary_path = tempfile.mkstemp(
+        prefix='.{}.'.format(name), dir=directory
+    )
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            yield file
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+    os.replace(temporary_path, path)
+
+
+def _split_command(arguments, stats, stack):
+    prefix = arguments.prefix or arguments.secret
+    if prefix == '-':
+        raise ValueError('--prefix is required when reading from stdin')
+    _check_split_arguments(arguments.threshold, arguments.shares)
+    secret_file = _open_input(arguments.secret, stack)
+    share_files = [
+        _open_output('{}.{}'.format(prefix, x), stack)
+        for x in range(1, arguments.shares + 1)
+    ]
+    chunks = _read_chunks(secret_file, arguments.chunk_size, stats)
+    results = _imap(
+        partial(
+            _split_chunk,
+            threshold=arguments.threshold,
+            share_count=arguments.shares
+        ),
+        chunks,
+        arguments.workers
+    )
+    first = True
+    for binary_shares in _timed_iter(results, stats, 'split'):
+        with stats.measure('write'):
+            for share_file, binary_share in zip(share_files, binary_shares):
+                _write_share_chunk(share_file, binary_share, first)
+        stats.byte_count += (
+            len(binary_shares[0]) - _share_header_length(binary_shares[0][0])
+        )
+        first = False
+    if first:
+        raise ValueError("can't split empty secret")
+
+
+def _recover_command(arguments, stats, stack):
+    share_files = [_open_input(path, stack) for path in arguments.shares]
+    output_file = _open_output(arguments.output, stack)
+    chunks = _read_share_chunks(share_files, arguments.chunk_size, stats)
+    results = _imap(_recover_chunk, chunks, arguments.workers)
+    for secret in _timed_iter(results, stats, 'recover'):
+        with stats.measure('write'):
+            output_file.write(secret)
+        stats.byte_count += len(secret)
+
+
+def _add_share_command(arguments, stats, stack):
+    if not (1 <= arguments.x < 256):
+        raise ValueError('x not in range(1, 256)')
+    share_files = [_open_input(path, stack) for path in arguments.shares]
+    output_file = _open_output(arguments.output, stack)
+    chunks = _read_share_chunks(share_files, arguments.chunk_size, stats)
+    results = _imap(
+        partial(_add_share_chunk, x=arguments.x), chunks, arguments.workers
+    )
+    first = True
+    for binary_share in _timed_iter(results, stats, 'add-share'):
+        with stats.measure('write'):
+            _write_share_chunk(output_file, binary_share, first)
+        stats.byte_count += (
+            len(binary_share) - _share_header_length(binary_share[0])
+        )
+        first = False
+
+
+def _inspect_command(arguments, stats, stack):
+    for path in arguments.shares:
+        share_file = _open_input(path, stack)
+        with stats.measure('read'):
+            header = _read_share_header(share_file)
+            first_byte = share_file.read(1)
+            share = Share.from_bytes(header + first_byte)
+            length = len(first_byte) + _remaining_length(share_file)
+        secret_id = '-'
+        if share.secret_id is not None:
+            secret_id = binascii.hexlify(share.secret_id).decode('ascii')
+        print(
+            '{}: version={} threshold={} x={} secret_id={} length={}'.format(
+                path, share.version, share._threshold, share.x, secret_id,
+                length
+            )
+        )
+        stats.byte_count += length
+
+
+def _remaining_length(file):
+    """
+    Returns the number of bytes left in `file`.
+
+    Regular files are not read, anything else (like a pipe) is consumed.
+    """
+    status = os.fstat(file.fileno())
+    if stat.S_ISREG(status.st_mode):
+        return status.st_size - file.tell()
+    length = 0
+    for chunk in iter(partial(file.read, _DEFAULT_CHUNK_SIZE), b''):
+        length += len(chunk)
+    return length
+
+
+def _positive_int(string):
+    value = int(string)
+    if value < 1:
+        raise ValueError()
+    return value
+
+
+def _create_parser():
+    import argparse
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        '--stats', action='store_true',
+        help='print the time spent in each phase and the throughput to stderr'
+    )
+    processing = argparse.ArgumentParser(add_help=False, parents=[common])
+    processing.add_argument(
+        '--workers', type=_positive_int, default=1,
+        help='number of processes to use (default: %(default)s)'
+    )
+    processing.add_argument(
+        '--chunk-size', type=_positive_int, default=_DEFAULT_CHUNK_SIZE,
+        help='number of secret bytes to process at once (default: '
+             '%(default)s)'
+    )
+
+    parser = argparse.ArgumentParser(
+        prog='subrosa', description="Shamir's Secret Sharing"
     )
+    parser.add_argument(
+        '--version', action='version', version='%(prog)s ' + __version__
+    )
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subparsers.required = True
+
+    split_parser = subparsers.add_parser(
+        'split', parents=[processing],
+        help='split a secret into shares',
+        description='Splits SECRET into shares written to PREFIX.X for every '
+                    'share X.'
+    )
+    split_parser.add_argument(
+        'secret', help="file containing the secret, '-' for stdin"
+    )
+    split_parser.add_argument(
+        '-t', '--threshold', type=int, required=True,
+        help='number of shares needed to recover the secret'
+    )
+    split_parser.add_argument(
+        '-n', '--shares', type=int, required=True,
+        help='number of shares to create'
+    )
+    split_parser.add_argument(
+        '-p', '--prefix', help='prefix of the share files (default: SECRET)'
+    )
+    split_parser.set_defaults(command_function=_split_command)
+
+    recover_parser = subparsers.add_parser(
+        'recover', parents=[processing],
+        help='recover a secret from shares'
+    )
+    recover_parser.add_argument('shares', nargs='+', metavar='share')
+    recover_parser.add_argument(
+        '-o', '--output', default='-',
+        help="file the secret is written to (default: '-' for stdout)"
+    )
+    recover_parser.set_defaults(command_function=_recover_command)
+
+    add_share_parser = subparsers.add_parser(
+        'add-share', parents=[processing],
+        help='create a new (or recreate a lost) share'
+    )
+    add_share_parser.add_argument('shares', nargs='+', metavar='share')
+    add_share_parser.add_argument(
+        '-x', type=int, required=True, help='the share to create'
+    )
+    add_share_parser.add_argument(
+        '-o', '--output', default='-',
+        help="file the share is written to (default: '-' for stdout)"
+    )
+    add_share_parser.set_defaults(command_function=_add_share_command)
+
+    inspect_parser = subparsers.add_parser(
+        'inspect', parents=[common],
+        help='print information about shares'
+    )
+    inspect_parser.add_argument('shares', nargs='+', metavar='share')
+    inspect_parser.set_defaults(command_function=_inspect_command)
+    return parser
+
+
+def main(argv=None):
+    """
+    Entry point of the ``subrosa`` command line interface.
+    """
+    parser = _create_parser()
+    arguments = parser.parse_args(argv)
+    stats = _Stats()
+    try:
+        with ExitStack() as stack:
+            arguments.command_function(arguments, stats, stack)
+    except (ValueError, NotImplementedError, OSError) as exc:
+        parser.error(str(exc))
+    except RuntimeError as exc:
+        parser.exit(1, '{}: error: {}\n'.format(parser.prog, exc))
+    if arguments.stats:
+        stats.report(sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
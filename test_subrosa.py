@@ -5,13 +5,28 @@
     :copyright: 2016 by Daniel Neuhäuser
     :license: BSD, see LICENSE.rst for details
 """
+import array
+import binascii
+import io
+import mmap
+import os
 import random
+import stat
+import subprocess
+import sys
 
 import pytest
+from gf256 import GF256
 from hypothesis import given, settings
 from hypothesis.strategies import binary, composite, integers, random_module
 
-from subrosa import Share, add_share, recover_secret, split_secret
+import subrosa
+from subrosa import (
+    Backend, Share, add_share, check_backends, collect_metrics, get_backend,
+    group_shares, main, recover_secret, recover_secret_into,
+    refresh_share_sets, refresh_shares, register_backend, set_backend,
+    split_secret
+)
 
 
 @composite
@@ -61,7 +76,72 @@ def test_split_and_recover_fast(secret):
         assert recovered_secret == secret
 
 
+def test_import_is_lazy():
+    """
+    Importing subrosa should be fast, in particular it shouldn't import
+    optional or slow to import modules.
+    """
+    lazy_modules = ['argparse', 'concurrent.futures', 'gf256', 'numpy']
+    output = subprocess.check_output([
+        sys.executable, '-c',
+        'import sys, subrosa; print(*sorted(sys.modules))'
+    ], universal_newlines=True)
+    imported_modules = set(output.split())
+    for module in lazy_modules:
+        assert module not in imported_modules
+
+
+@pytest.fixture
+def reset_backend(monkeypatch):
+    monkeypatch.setattr(subrosa, '_backend_name', None)
+    monkeypatch.setattr(subrosa, '_backends', subrosa._backends.copy())
+
+
+@pytest.mark.usefixtures('reset_backend')
+@pytest.mark.parametrize('backend', ['gf256', 'table', 'translate', 'numpy'])
+def test_split_and_recover_backend(backend):
+    set_backend(backend)
+    assert get_backend().name == backend
+    secret = bytes(range(256))
+    shares = split_secret(secret, 3, 5)
+    assert recover_secret(shares[2:]) == secret
+    new_share = add_share(shares[:3], 6)
+    assert recover_secret([new_share, shares[0], shares[4]]) == secret
+
+
 class TestShare:
+    def test_version(self):
+        assert Share.version == 1
+        assert Share(2, 1, [2]).version == 1
+        assert Share(2, 1, [2], b'12345678').version == 2
+
+    def test_ys_stored_as_bytes(self):
+        shares = split_secret(b'secret', 2, 3)
+        shares.append(Share.from_bytes(bytes(shares[0])))
+        shares.append(add_share(shares[:2], 4))
+        shares.extend(refresh_shares(shares[:3]))
+        shares.append(Share(2, 1, [1, 2, 3]))
+        for share in shares:
+            assert isinstance(share._ys, (bytes, bytearray))
+
+    def test_secret_id_assignment(self):
+        share = split_secret(b'secret', 2, 3)[0]
+        share.secret_id = None
+        assert share.version == 1
+        assert Share.from_bytes(bytes(share))._ys == share._ys
+        share.secret_id = b'87654321'
+        assert share.version == 2
+        assert Share.from_bytes(bytes(share)).secret_id == b'87654321'
+
+    def test_invalid_secret_id(self):
+        with pytest.raises(ValueError):
+            Share(2, 1, [2], b'1234')
+        share = Share(2, 1, [2], b'12345678')
+        with pytest.raises(ValueError):
+            share.secret_id = b'123456789'
+        assert share.secret_id == b'12345678'
+        assert share.version == 2
+
     def test_from_bytes(self):
         share = Share(2, 1, [2])
         binary = bytes(share)
@@ -69,7 +149,31 @@ class TestShare:
         assert parsed_share.version == 1
         assert parsed_share._threshold == 2
         assert parsed_share.x == 1
-        assert parsed_share._ys == [2]
+        assert parsed_share._ys == b'\x02'
+
+    @pytest.mark.parametrize('buffer_type', [bytearray, memoryview])
+    def test_from_bytes_buffer(self, buffer_type):
+        share = Share(2, 1, [2, 3])
+        parsed_share = Share.from_bytes(buffer_type(bytes(share)))
+        assert parsed_share._threshold == 2
+        assert parsed_share.x == 1
+        assert parsed_share._ys == b'\x02\x03'
+
+    def test_from_bytes_secret_id(self):
+        share = Share(2, 1, [2], b'12345678')
+        binary = bytes(share)
+        assert len(binary) == 12
+        parsed_share = Share.from_bytes(binary)
+        assert parsed_share.version == 2
+        assert parsed_share.secret_id == b'12345678'
+        assert parsed_share._threshold == 2
+        assert parsed_share.x == 1
+        assert parsed_share._ys == b'\x02'
+
+    def test_from_bytes_truncated_secret_id(self):
+        binary = bytes(Share(2, 1, [2], b'12345678'))
+        with pytest.raises(ValueError):
+            Share.from_bytes(binary[:-1])
 
     def test_from_bytes_invalid_version(self):
         share = Share(2, 1, [2])
@@ -85,6 +189,11 @@ class TestShare:
         with pytest.raises(ValueError):
             Share.from_bytes(invalid_binary)
 
+    @pytest.mark.parametrize('binary', [b'', b'\x01', b'\x01\x02\x01'])
+    def test_from_bytes_truncated(self, binary):
+        with pytest.raises(ValueError):
+            Share.from_bytes(binary)
+
 
 class TestSplitSecret:
     def test_empty_secret(self):
@@ -107,6 +216,31 @@ class TestSplitSecret:
         with pytest.raises(ValueError):
             split_secret(b'a', 2, 256)
 
+    @pytest.mark.parametrize('buffer_type', [bytearray, memoryview])
+    def test_buffer(self, buffer_type):
+        shares = split_secret(buffer_type(b'secret'), 2, 3)
+        assert recover_secret(shares[:2]) == b'secret'
+
+    def test_array(self):
+        secret = array.array('H', [1, 2, 3])
+        shares = split_secret(secret, 2, 3)
+        assert recover_secret(shares[:2]) == secret.tobytes()
+
+    def test_mmap(self):
+        secret = mmap.mmap(-1, 6)
+        secret.write(b'secret')
+        shares = split_secret(secret, 2, 3)
+        assert recover_secret(shares[:2]) == b'secret'
+        secret.close()
+
+    def test_non_contiguous_buffer(self):
+        shares = split_secret(memoryview(b'sxeycxrxeytx')[::2], 2, 3)
+        assert recover_secret(shares[:2]) == b'secret'
+
+    def test_empty_buffer(self):
+        with pytest.raises(ValueError):
+            split_secret(bytearray(), 2, 2)
+
 
 class TestRecoverSecret:
     def test_empty_shares(self):
@@ -125,12 +259,65 @@ class TestRecoverSecret:
         with pytest.raises(ValueError):
             recover_secret(shares_a[:1] + shares_b[:2])
 
+    def test_incompatible_shares_secret_id(self):
+        shares_a = split_secret(b'a', 2, 3)
+        shares_b = split_secret(b'b', 2, 3)
+        with pytest.raises(ValueError):
+            recover_secret(shares_a[:1] + shares_b[1:2])
+
+    def test_duplicate_x(self):
+        shares = split_secret(b'a', 2, 3)
+        with pytest.raises(ValueError):
+            recover_secret([shares[0], shares[1], shares[1]])
+
     def test_less_than_threshold(self):
         shares = split_secret(b'a', 2, 2)
         with pytest.raises(ValueError):
             recover_secret(shares[:1])
 
 
+class TestRecoverSecretInto:
+    def test_bytearray(self):
+        shares = split_secret(b'secret', 2, 3)
+        out = bytearray(6)
+        assert recover_secret_into(shares[:2], out) == 6
+        assert out == b'secret'
+
+    def test_larger_buffer(self):
+        shares = split_secret(b'secret', 2, 3)
+        out = bytearray(b'\xff' * 8)
+        assert recover_secret_into(shares[:2], memoryview(out)) == 6
+        assert out == b'secret\xff\xff'
+
+    def test_mmap(self):
+        shares = split_secret(b'secret', 2, 3)
+        out = mmap.mmap(-1, 6)
+        assert recover_secret_into(shares[:2], out) == 6
+        assert out[:] == b'secret'
+        out.close()
+
+    def test_buffer_too_small(self):
+        shares = split_secret(b'secret', 2, 3)
+        with pytest.raises(ValueError):
+            recover_secret_into(shares[:2], bytearray(5))
+
+    def test_read_only_buffer(self):
+        shares = split_secret(b'secret', 2, 3)
+        with pytest.raises(TypeError):
+            recover_secret_into(shares[:2], bytes(6))
+
+    def test_non_contiguous_buffer(self):
+        shares = split_secret(b'secret', 2, 3)
+        with pytest.raises(ValueError):
+            recover_secret_into(shares[:2], memoryview(bytearray(12))[::2])
+
+    def test_incompatible_shares(self):
+        shares_a = split_secret(b'a', 2, 3)
+        shares_b = split_secret(b'ab', 2, 3)
+        with pytest.raises(ValueError):
+            recover_secret_into(shares_a[:1] + shares_b[:1], bytearray(2))
+
+
 class TestAddShare:
     def test_new_share(self):
         shares = split_secret(b'secret', 2, 2)
@@ -162,3 +349,587 @@ class TestAddShare:
         shares = split_secret(b'secret', 2, 2)
         with pytest.raises(ValueError):
             add_share(shares, 256)
+
+
+class TestField:
+    def test_multiply(self):
+        for a in range(256):
+            for b in range(256):
+                assert subrosa._multiply(a, b) == int(GF256(a) * GF256(b))
+
+    def test_divide(self):
+        for a in range(256):
+            for b in range(1, 256):
+                assert subrosa._divide(a, b) == int(GF256(a) / GF256(b))
+
+    def test_divide_by_zero(self):
+        with pytest.raises(ZeroDivisionError):
+            subrosa._divide(1, 0)
+
+
+class TestGroupShares:
+    def test_groups(self):
+        shares_a = split_secret(b'a', 2, 3)
+        shares_b = split_secret(b'b', 3, 3)
+        shares_c = split_secret(b'c', 2, 3)
+        pool = [
+            shares_b[2], shares_a[0], shares_c[1], shares_b[0], shares_a[2],
+            shares_b[1]
+        ]
+        result = group_shares(pool)
+        assert result.groups == [
+            [shares_b[2], shares_b[0], shares_b[1]],
+            [shares_a[0], shares_a[2]]
+        ]
+        assert result.incomplete == [[shares_c[1]]]
+        assert result.duplicates == []
+        assert result.conflicts == []
+        assert [recover_secret(group) for group in result.groups] == [
+            b'b', b'a'
+        ]
+
+    def test_duplicates(self):
+        shares = split_secret(b'secret', 2, 3)
+        duplicate = Share.from_bytes(bytes(shares[0]))
+        result = group_shares(shares[:2] + [duplicate])
+        assert result.groups == [shares[:2]]
+        assert result.duplicates == [duplicate]
+
+    def test_conflicts(self):
+        shares = split_secret(b'secret', 2, 3)
+        forged = Share(2, 1, [0] * 6, shares[0].secret_id)
+        result = group_shares(shares + [forged])
+        assert result.groups == [shares[1:]]
+        assert result.conflicts == [[shares[0], forged]]
+        assert recover_secret(result.groups[0]) == b'secret'
+
+    def test_only_conflicts(self):
+        share = Share(2, 1, [1], b'12345678')
+        forged = Share(2, 1, [2], b'12345678')
+        result = group_shares([share, forged])
+        assert result.groups == []
+        assert result.incomplete == []
+        assert result.conflicts == [[share, forged]]
+
+    def test_refreshed(self):
+        shares = split_secret(b'secret', 2, 3)
+        refreshed_shares = refresh_shares(shares)
+        result = group_shares(
+            [shares[0], refreshed_shares[1], shares[2], refreshed_shares[0]]
+        )
+        assert result.groups == [
+            [shares[0], shares[2]],
+            [refreshed_shares[1], refreshed_shares[0]]
+        ]
+        assert result.conflicts == []
+        assert [recover_secret(group) for group in result.groups] == [
+            b'secret', b'secret'
+        ]
+
+    def test_without_secret_id(self):
+        shares = [
+            Share(2, share.x, share._ys)
+            for share in split_secret(b'secret', 2, 2)
+        ]
+        result = group_shares(shares)
+        assert result.groups == [shares]
+        assert recover_secret(shares) == b'secret'
+
+    def test_empty(self):
+        assert group_shares([]) == ([], [], [], [])
+
+
+class TestRefreshShares:
+    def test_refresh(self):
+        shares = split_secret(b'secret', 2, 3)
+        refreshed_shares = refresh_shares(shares)
+        assert [share.x for share in refreshed_shares] == [1, 2, 3]
+        assert all(share._threshold == 2 for share in refreshed_shares)
+        assert all(
+            share.secret_id == refreshed_shares[0].secret_id
+            for share in refreshed_shares
+        )
+        assert refreshed_shares[0].secret_id != shares[0].secret_id
+        with pytest.raises(ValueError):
+            recover_secret([shares[0], refreshed_shares[1]])
+        for subset in [[0, 1], [0, 2], [1, 2]]:
+            assert recover_secret(
+                [refreshed_shares[i] for i in subset]
+            ) == b'secret'
+
+    def test_shares_change(self):
+        secret = bytes(range(256)) * 4
+        shares = split_secret(secret, 3, 3)
+        refreshed_shares = refresh_shares(shares)
+        for share, refreshed_share in zip(shares, refreshed_shares):
+            assert share._ys != refreshed_share._ys
+        assert recover_secret(refreshed_shares) == secret
+
+    def test_refresh_version_1(self):
+        shares = [
+            Share(2, share.x, share._ys)
+            for share in split_secret(b'secret', 2, 3)
+        ]
+        refreshed_shares = refresh_shares(shares)
+        assert all(share.secret_id is None for share in refreshed_shares)
+        assert recover_secret(refreshed_shares[1:]) == b'secret'
+
+    def test_insufficient_shares(self):
+        shares = split_secret(b'secret', 2, 3)
+        with pytest.raises(ValueError):
+            refresh_shares(shares[:1])
+
+    def test_incompatible_shares(self):
+        shares_a = split_secret(b'a', 2, 3)
+        shares_b = split_secret(b'ab', 2, 3)
+        with pytest.raises(ValueError):
+            refresh_shares(shares_a[:1] + shares_b[1:2])
+
+    def test_share_sets(self):
+        secrets = [b'a', b'secret', b'x' * 70000, b'other', b'foo']
+        share_sets = [
+            split_secret(secrets[0], 2, 3)[1:],
+            split_secret(secrets[1], 2, 3),
+            split_secret(secrets[2], 2, 3),
+            split_secret(secrets[3], 3, 4),
+            split_secret(secrets[4], 2, 3)[::-1]
+        ]
+        refreshed_sets = refresh_share_sets(share_sets)
+        assert len(refreshed_sets) == len(share_sets)
+        for secret, shares, refreshed_shares in zip(
+            secrets, share_sets, refreshed_sets
+        ):
+            assert (
+                [share.x for share in refreshed_shares] ==
+                [share.x for share in shares]
+            )
+            assert recover_secret(refreshed_shares) == secret
+
+
+@pytest.mark.usefixtures('reset_backend')
+class TestBackends:
+    def test_auto(self):
+        set_backend('auto')
+        assert get_backend(1).name == 'translate'
+        assert get_backend(16 * 1024).name == 'numpy'
+
+    def test_gf256_unavailable(self, monkeypatch):
+        monkeypatch.setitem(sys.modules, 'gf256', None)
+        with pytest.raises(ValueError):
+            set_backend('gf256')
+
+    def test_auto_without_numpy(self, monkeypatch):
+        monkeypatch.setitem(sys.modules, 'numpy', None)
+        assert get_backend(16 * 1024).name == 'translate'
+
+    def test_environment_variable(self, monkeypatch):
+        monkeypatch.setenv('SUBROSA_BACKEND', 'table')
+        assert get_backend().name == 'table'
+
+    def test_invalid_environment_variable(self, monkeypatch):
+        monkeypatch.setenv('SUBROSA_BACKEND', 'unknown')
+        with pytest.raises(RuntimeError) as excinfo:
+            split_secret(b'secret', 2, 3)
+        assert 'SUBROSA_BACKEND' in str(excinfo.value)
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            set_backend('unknown')
+
+    def test_unavailable_backend(self, monkeypatch):
+        monkeypatch.setitem(sys.modules, 'numpy', None)
+        with pytest.raises(ValueError):
+            set_backend('numpy')
+
+    def test_interface(self):
+        backend = Backend()
+        assert backend.is_available()
+        with pytest.raises(NotImplementedError):
+            backend.evaluate([b'a'], [1])
+        with pytest.raises(NotImplementedError):
+            backend.interpolate([1], [b'a'])
+
+    def test_check_backends(self):
+        assert check_backends() == ['gf256', 'table', 'translate', 'numpy']
+
+    def test_check_backends_unavailable(self, monkeypatch):
+        monkeypatch.setitem(sys.modules, 'numpy', None)
+        assert check_backends() == ['gf256', 'table', 'translate']
+
+    def test_check_backends_disagreement(self):
+        class BrokenBackend(subrosa._TableBackend):
+            name = 'broken'
+
+            def evaluate(self, coefficients, xs):
+                # Ignores all coefficients except the free one.
+                return [bytes(coefficients[0]) for _ in xs]
+
+        register_backend(BrokenBackend())
+        with pytest.raises(RuntimeError):
+            check_backends()
+
+    def test_bytes_like_arguments(self):
+        coefficients = [bytes(range(16)), bytes(range(16, 32))]
+        ys = [bytes(range(32, 48)), bytes(range(48, 64))]
+        for backend in subrosa._backends.values():
+            evaluated = backend.evaluate(coefficients, [1, 2])
+            assert backend.evaluate(
+                [memoryview(row) for row in coefficients], [1, 2]
+            ) == evaluated
+            interpolated = backend.interpolate([3, 4], ys)
+            assert type(interpolated) is bytes
+            assert backend.interpolate(
+                [3, 4], [bytearray(y) for y in ys]
+            ) == interpolated
+            out = bytearray(b'x' * 18)
+            backend.interpolate_into(
+                [3, 4], [memoryview(y) for y in ys], memoryview(out)[1:17]
+            )
+            assert out == b'x' + interpolated + b'x'
+
+    def test_default_interpolate_into(self):
+        class CopyingBackend(subrosa._TranslateBackend):
+            name = 'copying'
+            interpolate_into = Backend.interpolate_into
+
+        register_backend(CopyingBackend())
+        set_backend('copying')
+        shares = split_secret(memoryview(b'secret'), 2, 3)
+        out = bytearray(6)
+        assert recover_secret_into(shares[1:], out) == 6
+        assert out == b'secret'
+
+    def test_recover_secret_into_in_place(self):
+        class InPlaceBackend(subrosa._TableBackend):
+            name = 'in-place'
+
+            def interpolate(self, basis, ys):
+                raise AssertionError('copy of the secret')
+
+        register_backend(InPlaceBackend())
+        set_backend('in-place')
+        shares = split_secret(bytearray(b'secret'), 2, 3)
+        out = bytearray(8)
+        assert recover_secret_into(shares[1:], out) == 6
+        assert out == b'secret\x00\x00'
+
+    def test_check_backends_failed_recovery(self):
+        class BrokenBackend(subrosa._TableBackend):
+            name = 'broken'
+
+            def interpolate(self, basis, ys):
+                return bytes(len(ys[0]))
+
+        register_backend(BrokenBackend())
+        with pytest.raises(RuntimeError):
+            check_backends()
+
+
+class TestCollectMetrics:
+    def test_split_secret(self):
+        with collect_metrics() as metrics:
+            split_secret(b'secret', 3, 4)
+        assert set(metrics.timers) == {'randomness', 'evaluation'}
+        assert metrics.counters == {
+            'bytes_processed': 6,
+            'field_operations': 2 * 2 * 4 * 6
+        }
+
+    def test_recover_secret(self):
+        shares = split_secret(b'secret', 2, 3)
+        with collect_metrics() as metrics:
+            recover_secret(shares[:2])
+            recover_secret_into(shares[:2], bytearray(6))
+        assert set(metrics.timers) == {'validation', 'interpolation'}
+        assert metrics.counters['bytes_processed'] == 12
+        assert metrics.counters['field_operations'] == 2 * 2 * 12
+        assert metrics.counters['cache_hits'] >= 1
+        assert (
+            metrics.counters['cache_hits'] +
+            metrics.counters['cache_misses']
+        ) == 2
+
+    def test_add_share(self):
+        shares = split_secret(b'secret', 2, 3)
+        with collect_metrics() as metrics:
+            add_share(shares[:2], 4)
+        assert set(metrics.timers) == {'validation', 'interpolation'}
+        assert metrics.counters['bytes_processed'] == 6
+
+    def test_serialization(self):
+        share = Share(2, 1, [1, 2, 3])
+        with collect_metrics() as metrics:
+            Share.from_bytes(bytes(share))
+        assert set(metrics.timers) == {'serialization', 'parsing'}
+        assert metrics.counters == {
+            'bytes_serialized': 6,
+            'bytes_parsed': 6
+        }
+
+    def test_callback(self):
+        exported = []
+        with collect_metrics(exported.append) as metrics:
+            split_secret(b'secret', 2, 2)
+        assert exported == [metrics]
+
+    def test_nested(self):
+        with collect_metrics() as outer:
+            split_secret(b'a', 2, 2)
+            with collect_metrics() as inner:
+                split_secret(b'bc', 2, 2)
+        assert outer.counters['bytes_processed'] == 3
+        assert inner.counters['bytes_processed'] == 2
+
+    def test_inactive(self):
+        with collect_metrics() as metrics:
+            pass
+        split_secret(b'secret', 2, 2)
+        assert not metrics.timers
+        assert not metrics.counters
+
+    def test_inactive_measure_is_shared(self):
+        assert subrosa._measure('a') is subrosa._measure('b')
+        with collect_metrics():
+            assert subrosa._measure('a') is not subrosa._measure('a')
+
+
+class TestMain:
+    def split(self, tmpdir, secret, *arguments):
+        secret_path = tmpdir.join('secret')
+        secret_path.write_binary(secret)
+        main(['split', str(secret_path)] + list(arguments))
+        return secret_path
+
+    def test_split_and_recover(self, tmpdir):
+        secret_path = self.split(
+            tmpdir, b'secret', '-t', '2', '-n', '3', '--chunk-size', '4'
+        )
+        for x in range(1, 4):
+            share_path = tmpdir.join('secret.{}'.format(x))
+            share = Share.from_bytes(share_path.read_binary())
+            assert share.x == x
+            assert share._threshold == 2
+            assert len(share._ys) == 6
+        output_path = tmpdir.join('recovered')
+        main([
+            'recover', str(secret_path) + '.3', str(secret_path) + '.1',
+            '-o', str(output_path), '--chunk-size', '4'
+        ])
+        assert output_path.read_binary() == b'secret'
+
+    def test_split_and_recover_workers(self, tmpdir):
+        secret = bytes(range(256))
+        self.split(
+            tmpdir, secret, '-t', '2', '-n', '2', '--chunk-size', '64',
+            '--workers', '2', '--prefix', str(tmpdir.join('share'))
+        )
+        output_path = tmpdir.join('recovered')
+        main([
+            'recover',
+            str(tmpdir.join('share.1')), str(tmpdir.join('share.2')),
+            '-o', str(output_path), '--chunk-size', '64', '--workers', '2'
+        ])
+        assert output_path.read_binary() == secret
+
+    def test_split_and_recover_stdio(self, tmpdir, monkeypatch):
+        prefix = str(tmpdir.join('share'))
+        monkeypatch.setattr(
+            sys, 'stdin', io.TextIOWrapper(io.BytesIO(b'secret'))
+        )
+        main(['split', '-', '-t', '2', '-n', '2', '--prefix', prefix])
+        stdout = io.TextIOWrapper(io.BytesIO())
+        monkeypatch.setattr(sys, 'stdout', stdout)
+        main(['recover', prefix + '.1', prefix + '.2'])
+        assert stdout.buffer.getvalue() == b'secret'
+
+    def test_split_stdin_without_prefix(self):
+        with pytest.raises(SystemExit):
+            main(['split', '-', '-t', '2', '-n', '2'])
+
+    def test_invalid_workers(self, tmpdir):
+        with pytest.raises(SystemExit):
+            self.split(
+                tmpdir, b'secret', '-t', '2', '-n', '2', '--workers', '0'
+            )
+
+    def test_recover_empty_share(self, tmpdir):
+        secret_path = self.split(tmpdir, b'secret', '-t', '2', '-n', '2')
+        empty_path = tmpdir.join('empty')
+        empty_path.write_binary(b'')
+        with pytest.raises(SystemExit):
+            main(['recover', str(secret_path) + '.1', str(empty_path)])
+
+    def test_split_empty_secret(self, tmpdir):
+        with pytest.raises(SystemExit):
+            self.split(tmpdir, b'', '-t', '2', '-n', '2')
+
+    def test_failed_split_keeps_shares(self, tmpdir):
+        secret_path = self.split(tmpdir, b'secret', '-t', '2', '-n', '3')
+        share_paths = [tmpdir.join('secret.{}'.format(x)) for x in [1, 2, 3]]
+        binary_shares = [path.read_binary() for path in share_paths]
+        with pytest.raises(SystemExit):
+            main(['split', str(secret_path), '-t', '5', '-n', '3'])
+        secret_path.write_binary(b'')
+        with pytest.raises(SystemExit):
+            main(['split', str(secret_path), '-t', '2', '-n', '3'])
+        assert [path.read_binary() for path in share_paths] == binary_shares
+        assert sorted(path.basename for path in tmpdir.listdir()) == [
+            'secret', 'secret.1', 'secret.2', 'secret.3'
+        ]
+
+    def test_failed_recover_keeps_output(self, tmpdir):
+        secret_path = self.split(tmpdir, b'secret', '-t', '2', '-n', '2')
+        output_path = tmpdir.join('recovered')
+        output_path.write_binary(b'existing')
+        with pytest.raises(SystemExit):
+            main([
+                'recover', str(secret_path) + '.1', '-o', str(output_path)
+            ])
+        assert output_path.read_binary() == b'existing'
+        assert 'recovered' in [path.basename for path in tmpdir.listdir()]
+        assert len(tmpdir.listdir()) == 4
+
+    def test_recover_insufficient_shares(self, tmpdir):
+        secret_path = self.split(tmpdir, b'secret', '-t', '2', '-n', '2')
+        with pytest.raises(SystemExit):
+            main(['recover', str(secret_path) + '.1'])
+
+    def test_add_share(self, tmpdir):
+        secret_path = self.split(tmpdir, b'secret', '-t', '2', '-n', '2')
+        share_path = tmpdir.join('secret.3')
+        main([
+            'add-share', '-x', '3', str(secret_path) + '.1',
+            str(secret_path) + '.2', '-o', str(share_path),
+            '--chunk-size', '4'
+        ])
+        shares = [
+            Share.from_bytes(tmpdir.join('secret.{}'.format(x)).read_binary())
+            for x in [1, 3]
+        ]
+        assert shares[1].x == 3
+        assert recover_secret(shares) == b'secret'
+
+    def test_recover_into_fifo(self, tmpdir):
+        secret_path = self.split(tmpdir, b'secret', '-t', '2', '-n', '2')
+        fifo_path = str(tmpdir.join('fifo'))
+        os.mkfifo(fifo_path)
+        # Opening the reading end first allows writing without a thread,
+        # the secret fits into the buffer of the pipe.
+        read_fd = os.open(fifo_path, os.O_RDONLY | os.O_NONBLOCK)
+        with open(read_fd, 'rb') as fifo:
+            main([
+                'recover', str(secret_path) + '.1', str(secret_path) + '.2',
+                '-o', fifo_path
+            ])
+            assert fifo.read() == b'secret'
+        assert stat.S_ISFIFO(os.stat(fifo_path).st_mode)
+
+    def test_recover_through_symlink(self, tmpdir):
+        secret_path = self.split(tmpdir, b'secret', '-t', '2', '-n', '2')
+        output_path = tmpdir.join('recovered')
+        output_path.write_binary(b'existing')
+        link_path = tmpdir.join('link')
+        link_path.mksymlinkto(output_path)
+        main([
+            'recover', str(secret_path) + '.1', str(secret_path) + '.2',
+            '-o', str(link_path)
+        ])
+        assert link_path.islink()
+        assert output_path.read_binary() == b'secret'
+
+    def test_failed_add_share_keeps_output(self, tmpdir):
+        secret_path = self.split(tmpdir, b'secret', '-t', '3', '-n', '3')
+        share_path = tmpdir.join('secret.4')
+        share_path.write_binary(b'existing')
+        with pytest.raises(SystemExit):
+            main([
+                'add-share', '-x', '4', str(secret_path) + '.1',
+                str(secret_path) + '.2', '-o', str(share_path)
+            ])
+        assert share_path.read_binary() == b'existing'
+        assert len(tmpdir.listdir()) == 5
+
+    def test_add_share_invalid_x(self, tmpdir):
+        secret_path = self.split(tmpdir, b'secret', '-t', '2', '-n', '2')
+        with pytest.raises(SystemExit):
+            main([
+                'add-share', '-x', '0', str(secret_path) + '.1',
+                str(secret_path) + '.2'
+            ])
+
+    def test_inspect(self, tmpdir, capsys):
+        secret_path = self.split(tmpdir, b'secret', '-t', '2', '-n', '2')
+        main(['inspect', str(secret_path) + '.2'])
+        out, _ = capsys.readouterr()
+        share = Share.from_bytes(tmpdir.join('secret.2').read_binary())
+        assert out == (
+            '{}.2: version=2 threshold=2 x=2 secret_id={} length=6\n'.format(
+                secret_path, binascii.hexlify(share.secret_id).decode('ascii')
+            )
+        )
+
+    def test_inspect_version_1(self, tmpdir, capsys):
+        share_path = tmpdir.join('share')
+        share_path.write_binary(bytes(Share(2, 1, [1, 2, 3])))
+        main(['inspect', str(share_path)])
+        out, _ = capsys.readouterr()
+        assert out == (
+            '{}: version=1 threshold=2 x=1 secret_id=- length=3\n'.format(
+                share_path
+            )
+        )
+
+    @pytest.mark.usefixtures('reset_backend')
+    def test_invalid_backend_environment_variable(self, tmpdir, monkeypatch,
+                                                  capsys):
+        monkeypatch.setenv('SUBROSA_BACKEND', 'unknown')
+        with pytest.raises(SystemExit) as excinfo:
+            self.split(tmpdir, b'secret', '-t', '2', '-n', '3')
+        assert excinfo.value.code == 1
+        _, err = capsys.readouterr()
+        assert err == (
+            'subrosa: error: invalid SUBROSA_BACKEND environment variable, '
+            'unknown backend: unknown\n'
+        )
+
+    def test_inspect_pipe(self, monkeypatch, capsys):
+        share = Share(2, 1, list(range(256)) * 100)
+        read_fd, write_fd = os.pipe()
+        with open(write_fd, 'wb') as pipe:
+            pipe.write(bytes(share)[:-100])
+        with open(read_fd, 'rb') as pipe:
+            monkeypatch.setattr(sys, 'stdin', io.TextIOWrapper(pipe))
+            main(['inspect', '-'])
+        out, _ = capsys.readouterr()
+        assert out == (
+            '-: version=1 threshold=2 x=1 secret_id=- length={}\n'.format(
+                256 * 100 - 100
+            )
+        )
+
+    def test_inspect_rejects_processing_options(self, tmpdir):
+        secret_path = self.split(tmpdir, b'secret', '-t', '2', '-n', '2')
+        for option in ['--workers', '--chunk-size']:
+            with pytest.raises(SystemExit):
+                main(['inspect', option, '2', str(secret_path) + '.1'])
+
+    def test_recover_version_1(self, tmpdir):
+        shares = split_secret(b'secret', 2, 2)
+        share_paths = []
+        for share in shares:
+            share_path = tmpdir.join('share.{}'.format(share.x))
+            share_path.write_binary(bytes(Share(2, share.x, share._ys)))
+            share_paths.append(str(share_path))
+        output_path = tmpdir.join('recovered')
+        main(
+            ['recover', '-o', str(output_path), '--chunk-size', '4'] +
+            share_paths
+        )
+        assert output_path.read_binary() == b'secret'
+
+    def test_stats(self, tmpdir, capsys):
+        self.split(tmpdir, b'secret', '-t', '2', '-n', '2', '--stats')
+        _, err = capsys.readouterr()
+        phases = [line.split()[0] for line in err.splitlines()]
+        assert phases == ['split', 'read', 'write', 'total']
+        assert '6 bytes' in err